@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import suppress
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import insert
+from database import engine
+from db_models import AuditEvent
+
+logger = logging.getLogger("uvicorn")
+
+
+class AuditEventType(str, Enum):
+    LOGIN = "LOGIN"
+    LOGIN_FAILED = "LOGIN_FAILED"
+    PASSWORD_CHANGED = "PASSWORD_CHANGED"
+    PASSWORD_RESET = "PASSWORD_RESET"
+    ROLE_CHANGED = "ROLE_CHANGED"
+    ROLE_DEFINITION_CHANGED = "ROLE_DEFINITION_CHANGED"
+    REFRESH_TOKEN_REUSED = "REFRESH_TOKEN_REUSED"
+
+    def __str__(self):
+        return f"{self.value}"
+
+
+class AuditLog:
+    """
+    Collects audit events in memory and writes them in batches.
+
+    Events are flushed by a background task once `batch_size` of them are
+    pending or every `flush_interval` seconds, whichever comes first. When
+    `capacity` events are pending the recording caller flushes them itself,
+    so producers are slowed down to the speed of the database instead of
+    events being dropped.
+
+    After a failed write only the background task retries, so requests do
+    not each wait on a database that is down. Until it succeeds, events
+    beyond `capacity` push out the oldest pending ones and are counted in
+    `dropped`.
+    """
+
+    def __init__(self, capacity: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._events = deque(maxlen=capacity)
+        self._flush_lock = threading.Lock()
+        self._failing = False
+        self._dropping = False
+        self.dropped = 0
+        self._loop = None
+        self._wakeup = None
+        self._wakeup_pending = False
+        self._task = None
+
+    def record(self, event: AuditEventType, user_email: str, detail: str = None):
+        if len(self._events) >= self.capacity and not self._failing:
+            self.flush()
+        if len(self._events) >= self.capacity:
+            self._drop(1)
+        self._events.append({
+            "event": str(event),
+            "user_email": user_email,
+            "detail": detail,
+            "created_at": datetime.utcnow()
+        })
+        if len(self._events) >= self.batch_size and self._loop is not None and not self._wakeup_pending:
+            self._wakeup_pending = True
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self) -> int:
+        written = 0
+        with self._flush_lock:
+            while self._events:
+                batch = []
+                while self._events and len(batch) < self.batch_size:
+                    batch.append(self._events.popleft())
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(insert(AuditEvent), batch)
+                except Exception as e:
+                    # Events recorded meanwhile may have refilled the buffer,
+                    # in which case the newest ones give way to the batch.
+                    self._drop(max(0, len(self._events) + len(batch) - self.capacity))
+                    self._events.extendleft(reversed(batch))
+                    if not self._failing:
+                        logger.error("Something went wrong writing audit events, retrying in the background")
+                        logger.error(str(e))
+                    self._failing = True
+                    break
+                written += len(batch)
+                if self._failing:
+                    self._failing = False
+                    self._dropping = False
+                    logger.warning(f"Audit events are written again, {self.dropped} dropped so far")
+        return written
+
+    def _drop(self, count: int):
+        if not count:
+            return
+        if not self._dropping:
+            self._dropping = True
+            logger.error("Audit log is full, dropping the oldest pending events")
+        self.dropped += count
+
+    @property
+    def pending(self) -> int:
+        return len(self._events)
+
+    async def _run(self):
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            self._wakeup.clear()
+            self._wakeup_pending = False
+            if self._events:
+                await asyncio.to_thread(self.flush)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._loop = None
+        self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+audit_log = AuditLog()
@@ -1,51 +1,110 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from functools import lru_cache
+import hashlib
+import secrets
+from jose import JWTError, jwk, jwt
 from fastapi.security import OAuth2PasswordBearer
-from dotenv import load_dotenv
+from typing import NamedTuple
 import os
-from sqlalchemy.orm import Session
 from db_models import User
-from database import get_db
+from database import UserShardSessions, get_users_db
 from fastapi import Depends, HTTPException, status
 from typing import List
 from permissions.base import ModelPermission
 from permissions.roles import get_role_permissions
+from signing_keys import get_keyset
 
 
 class BearAuthException(Exception):
     pass
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-load_dotenv()
-SECRET_KEY = os.environ["SECRET_KEY"]
-ALGORITHM = str(os.environ["ALGORITHM"])
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"])
+
+class AuthSettings(NamedTuple):
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
+    refresh_token_expire_days: int
+
+
+@lru_cache
+def get_auth_settings() -> AuthSettings:
+    from dotenv import load_dotenv
+    load_dotenv()
+    return AuthSettings(
+        secret_key=os.environ["SECRET_KEY"],
+        algorithm=str(os.environ["ALGORITHM"]),
+        access_token_expire_minutes=int(os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"]),
+        refresh_token_expire_days=int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS") or 30)
+    )
+
+
+@lru_cache
+def get_secret_key():
+    # Built once, so jose does not construct a new key object per token.
+    settings = get_auth_settings()
+    return jwk.construct(settings.secret_key, settings.algorithm)
+
+
+@lru_cache
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
-def create_access_token(data: str, expire_minutes=ACCESS_TOKEN_EXPIRE_MINUTES):
+def create_access_token(data: str, expire_minutes: int = None):
+    settings = get_auth_settings()
+    if expire_minutes is None:
+        expire_minutes = settings.access_token_expire_minutes
     to_encode = {"sub": data}
     expire = datetime.utcnow() + timedelta(minutes=expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    keyset = get_keyset()
+    if keyset is None:
+        return jwt.encode(to_encode, get_secret_key(), algorithm=settings.algorithm)
+    signing_key = keyset.signing_key
+    return jwt.encode(
+        to_encode, signing_key.private_key, algorithm=signing_key.algorithm, headers={"kid": signing_key.kid})
+
+
+def create_refresh_token(prefix: str = ""):
+    # Refresh tokens are random rather than derived from a password, so a
+    # single fast hash is enough to keep them unusable if the table leaks.
+    refresh_token = prefix + secrets.token_urlsafe(32)
+    return refresh_token, hash_refresh_token(refresh_token)
+
+
+def hash_refresh_token(refresh_token: str):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def _verification_key(token: str):
+    keyset = get_keyset()
+    kid = jwt.get_unverified_header(token).get("kid")
+    if keyset is not None and kid is not None:
+        signing_key = keyset.keys.get(kid)
+        if signing_key is None:
+            raise BearAuthException("Token signed with an unknown key")
+        return signing_key.public_key, signing_key.algorithm
+    if keyset is None or keyset.accept_secret_key_tokens:
+        return get_secret_key(), get_auth_settings().algorithm
+    raise BearAuthException("Token could not be validated")
 
 
 def get_token_payload(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        key, algorithm = _verification_key(token)
+        payload = jwt.decode(token, key, algorithms=[algorithm])
         payload_sub: str = payload.get("sub")
         if payload_sub is None:
             raise BearAuthException("Token could not be validated")
@@ -54,8 +113,8 @@ def get_token_payload(token: str = Depends(oauth2_scheme)):
         raise BearAuthException("Token could not be validated")
 
 
-def authenticate_user(db: Session, user_email: str, password: str):
-    user = db.query(User).filter(User.email == user_email).first()
+def authenticate_user(db: UserShardSessions, user_email: str, password: str):
+    user = db.for_email(user_email).query(User).filter(User.email == user_email).first()
     if not user:
         return False
     if not verify_password(password, user.password):
@@ -63,12 +122,12 @@ def authenticate_user(db: Session, user_email: str, password: str):
     return user
 
 
-def get_user_by_email(db: Session, user_email: str):
-    user = db.query(User).filter(User.email == user_email).first()
+def get_user_by_email(db: UserShardSessions, user_email: str):
+    user = db.for_email(user_email).query(User).filter(User.email == user_email).first()
     return user
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def get_current_user(db: UserShardSessions = Depends(get_users_db), token: str = Depends(oauth2_scheme)):
     try:
         user_email = get_token_payload(token)
     except BearAuthException:
@@ -78,7 +137,7 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-    user = db.query(User).filter(User.email == user_email).first()
+    user = db.for_email(user_email).query(User).filter(User.email == user_email).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -88,7 +147,7 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
     return user
 
 
-def get_current_user_via_temp_token(access_token: str, db: Session = Depends(get_db)):
+def get_current_user_via_temp_token(access_token: str, db: UserShardSessions = Depends(get_users_db)):
     try:
         user_email = get_token_payload(access_token)
     except BearAuthException:
@@ -98,7 +157,7 @@ def get_current_user_via_temp_token(access_token: str, db: Session = Depends(get
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-    user = db.query(User).filter(User.email == user_email).first()
+    user = db.for_email(user_email).query(User).filter(User.email == user_email).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -113,8 +172,9 @@ class PermissionChecker:
         self.permissions_required = permissions_required
 
     def __call__(self, user: User = Depends(get_current_user)):
+        role_permissions = get_role_permissions(user.role)
         for permission_required in self.permissions_required:
-            if permission_required not in get_role_permissions(user.role):
+            if str(permission_required) not in role_permissions:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="Not enough permissions to access this resource")
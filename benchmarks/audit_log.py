@@ -0,0 +1,66 @@
+"""
+Measures audit events/sec through the batched audit log, end to end
+including the final flush, against one insert and commit per event.
+
+Usage: python benchmarks/audit_log.py [events] [producer_threads]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import func, insert, select
+from database import engine
+from db_models import AuditEvent, create_schema
+from audit.audit_log import AuditLog, AuditEventType
+
+EVENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+PRODUCERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+
+def produce(audit_log, count, producer):
+    for i in range(count):
+        audit_log.record(AuditEventType.LOGIN, f"user{producer}-{i % 1000}@example.com")
+
+
+async def batched():
+    audit_log = AuditLog()
+    audit_log.start()
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(PRODUCERS) as pool:
+        await asyncio.gather(*(
+            loop.run_in_executor(pool, produce, audit_log, EVENTS // PRODUCERS, producer)
+            for producer in range(PRODUCERS)
+        ))
+    recorded = time.perf_counter() - start
+    await audit_log.stop()
+    return recorded, time.perf_counter() - start
+
+
+def per_event(count):
+    start = time.perf_counter()
+    for i in range(count):
+        with engine.begin() as connection:
+            connection.execute(insert(AuditEvent).values(
+                event="LOGIN", user_email=f"user-{i % 1000}@example.com", created_at=func.now()))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    create_schema(engine)
+    recorded, total = asyncio.run(batched())
+    with engine.connect() as connection:
+        stored = connection.execute(select(func.count()).select_from(AuditEvent)).scalar()
+    assert stored == EVENTS // PRODUCERS * PRODUCERS, stored
+    sample = min(EVENTS, 5000)
+    naive = per_event(sample)
+    print(f"{PRODUCERS} producer threads")
+    print(f"batched, recording only:   {EVENTS / recorded:12,.0f} events/s")
+    print(f"batched, including flush:  {EVENTS / total:12,.0f} events/s")
+    print(f"insert and commit per event: {sample / naive:10,.0f} events/s")
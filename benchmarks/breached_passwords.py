@@ -0,0 +1,46 @@
+"""
+Builds a Bloom filter of random passwords and measures its size, lookup
+latency and observed false positive rate.
+
+Usage: python benchmarks/breached_passwords.py [entries] [fp_rate]
+"""
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from breached_passwords.bloom_filter import BloomFilter, build_bloom_filter, password_digest
+
+ENTRIES = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+FP_RATE = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+LOOKUPS = 200_000
+
+
+def lookup_ns(bloom_filter, passwords):
+    start = time.perf_counter_ns()
+    for password in passwords:
+        password in bloom_filter
+    return (time.perf_counter_ns() - start) / len(passwords)
+
+
+if __name__ == "__main__":
+    breached = [secrets.token_urlsafe(9) for _ in range(ENTRIES)]
+    path = os.path.join(tempfile.mkdtemp(), "breached.bloom")
+
+    start = time.perf_counter()
+    num_bits, num_hashes = build_bloom_filter((password_digest(p) for p in breached), ENTRIES, path, FP_RATE)
+    print(f"built {ENTRIES} entries in {time.perf_counter() - start:.1f}s: "
+          f"{os.path.getsize(path) / 2 ** 20:.1f} MiB, {num_hashes} hash functions")
+
+    bloom_filter = BloomFilter(path)
+    hits = breached[:LOOKUPS]
+    misses = [secrets.token_urlsafe(10) for _ in range(LOOKUPS)]
+    assert all(password in bloom_filter for password in hits)
+    false_positives = sum(password in bloom_filter for password in misses)
+
+    print(f"lookup of a breached password: {lookup_ns(bloom_filter, hits):7.0f} ns")
+    print(f"lookup of an unknown password: {lookup_ns(bloom_filter, misses):7.0f} ns")
+    print(f"false positive rate: {false_positives / LOOKUPS:.5f} (target {FP_RATE})")
@@ -0,0 +1,59 @@
+"""
+Measures the CPU spent per dashboard poll of the user and role endpoints,
+with and without a matching If-None-Match header.
+
+Usage: python benchmarks/etag_polling.py [users] [polls]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(tempfile.mkdtemp())
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("SENDER_GMAIL", "benchmark@example.com")
+os.environ.setdefault("SENDER_GMAIL_PASSWORD", "benchmark")
+
+from fastapi.testclient import TestClient
+import main
+from database import SessionLocal
+from db_models import User
+from authentication import create_access_token, get_password_hash
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+POLLS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+def seed(db, count):
+    password = get_password_hash("benchmark")
+    db.add(User(email="admin@example.com", password=password, name="Admin", role="ADMINISTRATOR"))
+    db.add_all(
+        User(email=f"user{i}@example.com", password=password, name=f"Name{i}", surname=f"Surname{i}", role="USER")
+        for i in range(count)
+    )
+    db.commit()
+
+
+def cpu_per_poll(client, path, headers):
+    start = time.process_time()
+    for _ in range(POLLS):
+        client.get(path, headers=headers)
+    return (time.process_time() - start) / POLLS * 1000
+
+
+if __name__ == "__main__":
+    with TestClient(main.app) as client:
+        db = SessionLocal()
+        seed(db, USERS)
+        db.close()
+        headers = {"Authorization": f"Bearer {create_access_token('admin@example.com')}"}
+        print(f"{USERS} users, {POLLS} polls per endpoint, CPU ms per poll")
+        for path in ["/v1/users", "/v1/users/me", "/v1/users/roles"]:
+            etag = client.get(path, headers=headers).headers["etag"]
+            assert client.get(path, headers={**headers, "If-None-Match": etag}).status_code == 304
+            full = cpu_per_poll(client, path, headers)
+            conditional = cpu_per_poll(client, path, {**headers, "If-None-Match": etag})
+            print(f"{path:<18} 200: {full:7.3f}  304: {conditional:7.3f}  saved: {full - conditional:7.3f}")
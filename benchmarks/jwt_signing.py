@@ -0,0 +1,47 @@
+"""
+Measures access token sign and verify throughput per algorithm, with keys
+parsed once as the keyset does, and with the key material parsed on every
+call as before.
+
+Usage: python benchmarks/jwt_signing.py [iterations]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jose import jwk, jwt
+from signing_keys import generate_private_key
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+
+def rate(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return iterations / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    claims = {"sub": "user@example.com", "exp": datetime.utcnow() + timedelta(minutes=60)}
+    key_material = {"HS256": "benchmark-secret"}
+    for algorithm in ("RS256", "ES256"):
+        key_material[algorithm] = generate_private_key(algorithm).decode()
+
+    print(f"{'algorithm':<10}{'sign/s':>12}{'verify/s':>12}{'sign/s raw':>14}{'verify/s raw':>14}")
+    for algorithm, material in key_material.items():
+        private_key = jwk.construct(material, algorithm)
+        public_key = private_key if algorithm == "HS256" else private_key.public_key()
+        public_material = material if algorithm == "HS256" else public_key.to_pem().decode()
+        token = jwt.encode(claims, private_key, algorithm=algorithm)
+        # RSA signing is slow enough that fewer iterations give a stable rate.
+        sign_iterations = ITERATIONS // 10 if algorithm.startswith("RS") else ITERATIONS
+
+        cached_sign = rate(lambda: jwt.encode(claims, private_key, algorithm=algorithm), sign_iterations)
+        cached_verify = rate(lambda: jwt.decode(token, public_key, algorithms=[algorithm]), ITERATIONS)
+        raw_sign = rate(lambda: jwt.encode(claims, material, algorithm=algorithm), sign_iterations)
+        raw_verify = rate(lambda: jwt.decode(token, public_material, algorithms=[algorithm]), ITERATIONS)
+        print(f"{algorithm:<10}{cached_sign:>12,.0f}{cached_verify:>12,.0f}{raw_sign:>14,.0f}{raw_verify:>14,.0f}")
@@ -0,0 +1,56 @@
+"""
+Measures what the profiling middleware adds to a request while profiling
+is disabled, by calling a no-op ASGI app with and without it in front.
+
+Usage: python benchmarks/profiling_overhead.py [calls]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from profiling.middleware import ProfilingMiddleware
+from profiling.profiler import RequestProfiler
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+SCOPE = {
+    "type": "http",
+    "method": "GET",
+    "path": "/v1/users/me",
+    "headers": [
+        (b"host", b"localhost:9999"),
+        (b"user-agent", b"benchmark"),
+        (b"accept", b"application/json"),
+        (b"accept-encoding", b"gzip, deflate"),
+        (b"connection", b"keep-alive"),
+        (b"authorization", b"Bearer eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"),
+        (b"if-none-match", b'"974ae89ffe06a92d8a8d3cc03f041ac26de16c2f"'),
+    ],
+}
+
+
+async def app(scope, receive, send):
+    pass
+
+
+async def per_call_ns(asgi_app):
+    start = time.perf_counter_ns()
+    for _ in range(CALLS):
+        await asgi_app(SCOPE, None, None)
+    return (time.perf_counter_ns() - start) / CALLS
+
+
+async def main():
+    middleware = ProfilingMiddleware(app, profiler=RequestProfiler())
+    bare = min([await per_call_ns(app) for _ in range(3)])
+    wrapped = min([await per_call_ns(middleware) for _ in range(3)])
+    print(f"no-op app:                      {bare:7.0f} ns/request")
+    print(f"behind disabled profiling:      {wrapped:7.0f} ns/request")
+    print(f"overhead:                       {wrapped - bare:7.0f} ns/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
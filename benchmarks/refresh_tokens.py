@@ -0,0 +1,50 @@
+"""
+Compares the throughput of getting a new access token by refresh token
+against logging in again with a password.
+
+Usage: python benchmarks/refresh_tokens.py [logins] [refreshes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(tempfile.mkdtemp())
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("SENDER_GMAIL", "benchmark@example.com")
+os.environ.setdefault("SENDER_GMAIL_PASSWORD", "benchmark")
+
+from fastapi.testclient import TestClient
+import main
+from database import SessionLocal
+from db_models import User
+from authentication import get_password_hash
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+REFRESHES = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+
+if __name__ == "__main__":
+    with TestClient(main.app) as client:
+        db = SessionLocal()
+        db.add(User(email="user@example.com", password=get_password_hash("benchmark"), name="User", role="USER"))
+        db.commit()
+        db.close()
+        credentials = {"username": "user@example.com", "password": "benchmark"}
+
+        start = time.perf_counter()
+        for _ in range(LOGINS):
+            refresh_token = client.post("/v1/token", data=credentials).json()["refresh_token"]
+        login_rate = LOGINS / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(REFRESHES):
+            response = client.post("/v1/token/refresh", json={"refresh_token": refresh_token})
+            refresh_token = response.json()["refresh_token"]
+        refresh_rate = REFRESHES / (time.perf_counter() - start)
+
+        print(f"password login: {login_rate:8.1f} tokens/s")
+        print(f"refresh token:  {refresh_rate:8.1f} tokens/s ({refresh_rate / login_rate:.0f}x)")
@@ -0,0 +1,110 @@
+"""
+Measures cold-start cost: the time to import `main` and the time until the
+first response is served, each in a fresh interpreter. Both are reported
+above the time to import FastAPI and SQLAlchemy alone, measured alongside,
+so the numbers are the app's own and comparable across machines. Exits
+non-zero when the median of either exceeds its threshold, so it can gate CI.
+The default thresholds are about 1.2x the medians measured when they were
+set, about 200 ms for the import and 310 ms for the first response; the
+code before lazy initialisation took 330-450 ms and 390-500 ms.
+
+Usage: python benchmarks/startup.py [--runs N] [--max-import-ms MS]
+                                    [--max-first-response-ms MS] [--audit]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PACKAGE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+ENVIRONMENT = {
+    "SECRET_KEY": "benchmark",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "SENDER_GMAIL": "benchmark@example.com",
+    "SENDER_GMAIL_PASSWORD": "benchmark",
+}
+
+FRAMEWORK_PROBE = """
+import json, time
+start = time.perf_counter()
+import fastapi, fastapi.routing, sqlalchemy.orm
+print(json.dumps({"import": time.perf_counter() - start}))
+"""
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {PACKAGE_DIR!r})
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/v1/users/roles")
+responded = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first_response": responded - start}}))
+"""
+
+
+def run(args, cwd):
+    environment = {**os.environ, **ENVIRONMENT}
+    return subprocess.run(
+        [sys.executable, *args], cwd=cwd, env=environment,
+        capture_output=True, text=True, check=True
+    )
+
+
+def probe(code, cwd):
+    return json.loads(run(["-c", code], cwd).stdout.strip().splitlines()[-1])
+
+
+def measure(runs):
+    frameworks, imports, first_responses = [], [], []
+    for _ in range(runs):
+        # A fresh directory per run means a fresh database, which is the
+        # slowest path through the schema check.
+        with tempfile.TemporaryDirectory() as cwd:
+            framework = probe(FRAMEWORK_PROBE, cwd)["import"] * 1000
+            result = probe(PROBE, cwd)
+        frameworks.append(framework)
+        imports.append(result["import"] * 1000 - framework)
+        first_responses.append(result["first_response"] * 1000 - framework)
+    return statistics.median(frameworks), statistics.median(imports), statistics.median(first_responses)
+
+
+def audit(top):
+    with tempfile.TemporaryDirectory() as cwd:
+        stderr = run(["-X", "importtime", "-c", f"import sys; sys.path.insert(0, {PACKAGE_DIR!r}); import main"], cwd).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        rows.append((int(cumulative), module.strip()))
+    print(f"\nSlowest {top} imports by cumulative time (ms)")
+    for cumulative, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:8.1f}  {module}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=250,
+                        help="above the framework import")
+    parser.add_argument("--max-first-response-ms", type=float, default=380,
+                        help="above the framework import")
+    parser.add_argument("--audit", action="store_true", help="print the slowest imports")
+    args = parser.parse_args()
+
+    framework_ms, import_ms, first_response_ms = measure(args.runs)
+    print(f"median framework import:                 {framework_ms:8.1f} ms")
+    print(f"median import above framework:           {import_ms:8.1f} ms (max {args.max_import_ms})")
+    print(f"median first response above framework:   {first_response_ms:8.1f} ms (max {args.max_first_response_ms})")
+    if args.audit:
+        audit(15)
+    if import_ms > args.max_import_ms or first_response_ms > args.max_first_response_ms:
+        print("startup regression: threshold exceeded")
+        sys.exit(1)
@@ -0,0 +1,79 @@
+"""
+Compares the FTS5-backed user search against a LIKE scan over the same
+columns.
+
+Usage: python benchmarks/user_search.py [users] [queries]
+"""
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import or_
+from database import SessionLocal, UserShardSessions, build_user_shards, engine
+from db_models import User, create_schema
+from database_crud import users_db_crud as db_crud
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+QUERIES = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+BATCH = 50_000
+
+
+def random_word(generator):
+    return "".join(generator.choice(string.ascii_lowercase) for _ in range(generator.randint(4, 9)))
+
+
+def seed(count):
+    generator = random.Random(0)
+    words = [random_word(generator) for _ in range(count // 20 + 100)]
+    connection = engine.raw_connection()
+    cursor = connection.cursor()
+    for start in range(0, count, BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, count)):
+            name, surname = generator.choice(words), generator.choice(words)
+            rows.append((f"{name}.{surname}{i}@example.com", "x", name.title(), surname.title(), "USER", 1))
+        cursor.executemany(
+            "INSERT INTO users (email, password, name, surname, role, version) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        connection.commit()
+    connection.close()
+    return words
+
+
+def like_search(db, query, limit):
+    pattern = f"%{query}%"
+    return db.main.query(User).filter(
+        or_(User.email.like(pattern), User.name.like(pattern), User.surname.like(pattern))
+    ).limit(limit).all()
+
+
+def timed(search, db, queries):
+    start = time.perf_counter()
+    for query in queries:
+        search(db, query, 20)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+if __name__ == "__main__":
+    create_schema(engine)
+    start = time.perf_counter()
+    words = seed(USERS)
+    print(f"seeded {USERS} users in {time.perf_counter() - start:.1f}s (index kept in sync by triggers)")
+
+    generator = random.Random(1)
+    # Prefixes of a name and a surname: selective, like a support lookup.
+    queries = [f"{generator.choice(words)[:4]} {generator.choice(words)[:3]}" for _ in range(QUERIES)]
+    single_prefixes = [generator.choice(words)[:5] for _ in range(QUERIES)]
+
+    # Seeded straight into the main database, so searched unsharded.
+    db = UserShardSessions(SessionLocal(), build_user_shards(1))
+    print(f"mean latency per query over {QUERIES} queries (ms)")
+    print(f"fts5 two-word prefix:   {timed(db_crud.search_users, db, queries):9.3f}")
+    print(f"fts5 single prefix:     {timed(db_crud.search_users, db, single_prefixes):9.3f}")
+    print(f"LIKE single substring:  {timed(like_search, db, single_prefixes):9.3f}")
+    db.main.close()
@@ -0,0 +1,107 @@
+"""
+Measures user writes/sec against the number of user shards, with writer
+processes, like uvicorn workers, each doing one commit per user through
+the same shard routing as the API: registrations (insert and version
+bump), then password changes (update and refresh token revocation).
+Password hashing is left out, it costs the same for any shard count.
+
+Usage: python benchmarks/user_sharding.py [users] [writer_processes] [shard counts...]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(tempfile.mkdtemp())
+
+from sqlalchemy import event
+from database import SessionLocal, UserShardSessions, build_user_shards
+from db_models import User, create_schema, create_user_shard_schema
+from database_crud.refresh_tokens_db_crud import mark_user_refresh_tokens_revoked
+from database_crud.table_versions_db_crud import bump_table_version
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+WRITERS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+SHARD_COUNTS = [int(count) for count in sys.argv[3:]] or [1, 2, 4, 8]
+
+
+def wait_for_locks(dbapi_connection, connection_record):
+    # Writers on the same shard queue on its lock instead of failing.
+    dbapi_connection.execute("PRAGMA busy_timeout = 30000")
+
+
+def shard_url(shard_count):
+    return f"sqlite:///./users-{shard_count}-{{index}}.db"
+
+
+def open_shards(shard_count):
+    shards = build_user_shards(shard_count, shard_url(shard_count))
+    for shard_engine in shards.engines:
+        event.listen(shard_engine, "connect", wait_for_locks)
+    return shards
+
+
+def register(shard, email, i):
+    shard.add(User(email=email, password="x", name=f"Name{i}", surname=f"Surname{i}", role="USER"))
+    shard.flush()
+    bump_table_version(shard, User.__tablename__)
+
+
+def change_password(shard, email, i):
+    shard.query(User).filter(User.email == email).first().password = "y"
+    mark_user_refresh_tokens_revoked(shard, email)
+
+
+def write_users(shard_count, writer, count, write):
+    shards = open_shards(shard_count)
+    for shard_engine in shards.engines:
+        # A forked writer must not reuse connections pooled by the parent.
+        shard_engine.dispose(close=False)
+    for i in range(count):
+        email = f"user{writer}-{i}@example.com"
+        db = UserShardSessions(SessionLocal(), shards)
+        shard = db.for_email(email)
+        write(shard, email, i)
+        shard.commit()
+        db.close()
+        db.main.close()
+
+
+def writes_per_second(shard_count, write):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(WRITERS) as pool:
+        futures = [
+            pool.submit(write_users, shard_count, writer, USERS // WRITERS, write)
+            for writer in range(WRITERS)
+        ]
+        for future in futures:
+            future.result()
+    return USERS / (time.perf_counter() - start)
+
+
+def benchmark(shard_count):
+    shards = open_shards(shard_count)
+    for shard_engine in shards.engines:
+        if shard_count == 1:
+            create_schema(shard_engine)
+        else:
+            create_user_shard_schema(shard_engine)
+    registrations = writes_per_second(shard_count, register)
+    password_changes = writes_per_second(shard_count, change_password)
+    spread = Counter(shards.shard_index(f"user{w}-{i}@example.com")
+                     for w in range(WRITERS) for i in range(USERS // WRITERS))
+    return registrations, password_changes, max(spread.values()) / (USERS / shard_count)
+
+
+if __name__ == "__main__":
+    print(f"{USERS} users, {WRITERS} writer processes, one commit per write, writes/s")
+    baseline = None
+    for shard_count in SHARD_COUNTS:
+        registrations, password_changes, imbalance = benchmark(shard_count)
+        baseline = baseline or (registrations, password_changes)
+        print(f"{shard_count} shard(s): registrations {registrations:8.1f} ({registrations / baseline[0]:4.2f}x), "
+              f"password changes {password_changes:8.1f} ({password_changes / baseline[1]:4.2f}x), "
+              f"largest shard {imbalance:4.2f}x its even share")
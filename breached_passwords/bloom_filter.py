@@ -0,0 +1,110 @@
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+
+# File layout: an 8 byte magic, the number of bits and the number of hash
+# functions, followed directly by the bit array. Keys are SHA-1 digests,
+# which are already uniformly distributed, so the bit positions are taken
+# straight from the digest by double hashing instead of hashing again.
+MAGIC = b"PWBLOOM1"
+HEADER = struct.Struct("<8sQI")
+
+
+def _positions(digest: bytes, num_bits: int, num_hashes: int):
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    for i in range(num_hashes):
+        yield (h1 + i * h2) % num_bits
+
+
+def password_digest(password: str) -> bytes:
+    return hashlib.sha1(password.encode("utf-8")).digest()
+
+
+class BloomFilter:
+    """
+    Read-only Bloom filter memory-mapped from a file, so every worker that
+    opens the same file shares the same pages of the page cache.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._bits = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_bits, self.num_hashes = HEADER.unpack_from(self._bits)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a breached passwords Bloom filter")
+        if len(self._bits) < HEADER.size + math.ceil(self.num_bits / 8):
+            raise ValueError(f"{path} is truncated")
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_digest(password_digest(password))
+
+    def contains_digest(self, digest: bytes) -> bool:
+        # Same positions as _positions, inlined since this runs on every
+        # password that is set.
+        bits = self._bits
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            if not bits[HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def close(self):
+        self._bits.close()
+
+
+def filter_size(expected_entries: int, false_positive_rate: float):
+    num_bits = max(8, math.ceil(-expected_entries * math.log(false_positive_rate) / math.log(2) ** 2))
+    num_hashes = max(1, round(num_bits / max(expected_entries, 1) * math.log(2)))
+    return num_bits, num_hashes
+
+
+def build_bloom_filter(digests, expected_entries: int, path: str, false_positive_rate: float = 0.001):
+    num_bits, num_hashes = filter_size(expected_entries, false_positive_rate)
+    bits = bytearray(math.ceil(num_bits / 8))
+    for digest in digests:
+        for position in _positions(digest, num_bits, num_hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    # Written next to the target and renamed into place, so workers that
+    # still have the previous filter mapped keep reading a consistent file.
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, num_bits, num_hashes))
+        file.write(bits)
+    os.replace(temporary_path, path)
+    return num_bits, num_hashes
+
+
+def _read_digests(path: str, sha1_input: bool):
+    with open(path, "r", encoding="utf-8", errors="surrogateescape") as file:
+        for line in file:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if sha1_input:
+                # Accepts the "HASH:COUNT" lines of the Pwned Passwords dumps.
+                yield bytes.fromhex(line.split(":", 1)[0])
+            else:
+                yield hashlib.sha1(line.encode("utf-8", errors="surrogateescape")).digest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a breached passwords Bloom filter.")
+    parser.add_argument("input", help="file with one password, or one SHA-1 hex digest with --sha1, per line")
+    parser.add_argument("output", help="path of the Bloom filter file to write")
+    parser.add_argument("--fp-rate", type=float, default=0.001, help="target false positive rate")
+    parser.add_argument("--sha1", action="store_true", help="input lines are SHA-1 hex digests")
+    args = parser.parse_args()
+
+    entries = sum(1 for _ in _read_digests(args.input, args.sha1))
+    num_bits, num_hashes = build_bloom_filter(
+        _read_digests(args.input, args.sha1), entries, args.output, args.fp_rate)
+    print(f"{entries} entries, {num_bits // 8} bytes, {num_hashes} hash functions")
@@ -0,0 +1,27 @@
+import os
+from functools import lru_cache
+from breached_passwords.bloom_filter import BloomFilter
+
+
+@lru_cache
+def get_breached_passwords_filter():
+    from dotenv import load_dotenv
+    load_dotenv()
+    path = os.environ.get("BREACHED_PASSWORDS_FILTER")
+    if not path:
+        return None
+    return BloomFilter(path)
+
+
+def is_breached_password(password: str) -> bool:
+    breached_passwords = get_breached_passwords_filter()
+    if breached_passwords is None:
+        return False
+    return password in breached_passwords
+
+
+def check_password_not_breached(password: str):
+    if is_breached_password(password):
+        raise ValueError(
+            "This password has appeared in a data breach, please choose a different one")
+    return password
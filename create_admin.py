@@ -0,0 +1,39 @@
+"""
+Creates an administrator on the user shard their email maps to, bringing
+the databases up to date first. Run it from the directory the API runs
+in, with the same USER_SHARDS.
+
+Usage: python create_admin.py admin@example.com "Admin name" "Admin surname"
+"""
+import argparse
+from getpass import getpass
+import schemas
+from database import SessionLocal, UserShardSessions
+from db_models import create_schemas
+from database_crud.users_db_crud import DuplicateError, add_user
+from permissions.role_watcher import role_permissions_watcher
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create an administrator.")
+    parser.add_argument("email")
+    parser.add_argument("name")
+    parser.add_argument("surname", nargs="?")
+    args = parser.parse_args()
+
+    create_schemas()
+    # Roles are checked against the snapshot the API would load.
+    role_permissions_watcher.refresh(force=True)
+    typed_password = getpass("Password (empty for a random one): ")
+    db = UserShardSessions(SessionLocal())
+    try:
+        user, password = add_user(db, schemas.UserSignUp(
+            email=args.email, password=typed_password, name=args.name, surname=args.surname, role="ADMINISTRATOR"))
+        print(f"Created {user.email} on user shard {db.shards.shard_index(user.email)}")
+        if not typed_password:
+            print(f"Password: {password}")
+    except DuplicateError as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+        db.main.close()
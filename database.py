@@ -1,8 +1,15 @@
+import bisect
+import hashlib
+import os
+from functools import lru_cache
+from typing import Dict, List
+from fastapi import Depends
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./local_storage.db"
+USER_SHARD_DATABASE_URL = "sqlite:///./local_storage.users-{index}.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -14,3 +21,99 @@ def get_db():
         yield db_session
     finally:
         db_session.close()
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class UserShards:
+    """
+    The databases users are spread across, and the consistent hash ring
+    that maps an email to the one holding it. Each shard gets many points
+    on the ring, so users split evenly and growing from N to N + 1 shards
+    only moves about 1 / (N + 1) of them.
+    """
+    VIRTUAL_NODES = 64
+
+    def __init__(self, engines: List):
+        self.engines = engines
+        self.session_factories = [
+            SessionLocal if shard_engine is engine
+            else sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            for shard_engine in engines
+        ]
+        ring = sorted(
+            (_ring_hash(f"shard-{index}-{node}"), index)
+            for index in range(len(engines))
+            for node in range(self.VIRTUAL_NODES)
+        )
+        self._ring_points = [point for point, _ in ring]
+        self._ring_shards = [index for _, index in ring]
+
+    def __len__(self):
+        return len(self.engines)
+
+    def shard_index(self, email: str) -> int:
+        if len(self.engines) == 1:
+            return 0
+        position = bisect.bisect(self._ring_points, _ring_hash(email)) % len(self._ring_points)
+        return self._ring_shards[position]
+
+
+def build_user_shards(count: int, url: str = USER_SHARD_DATABASE_URL) -> UserShards:
+    # A single shard is the main database, so unsharded deployments keep
+    # their users where they always were.
+    if count <= 1:
+        return UserShards([engine])
+    return UserShards([create_engine(url.format(index=index)) for index in range(count)])
+
+
+@lru_cache
+def get_user_shards() -> UserShards:
+    from dotenv import load_dotenv
+    load_dotenv()
+    return build_user_shards(int(os.environ.get("USER_SHARDS") or 1))
+
+
+class UserShardSessions:
+    """
+    Sessions for one unit of work: `main` on the main database, plus one
+    per user shard, opened the first time a user on that shard is touched.
+    Users on the main database share the `main` session.
+    """
+
+    def __init__(self, main: Session, shards: UserShards = None):
+        self.main = main
+        self.shards = shards if shards is not None else get_user_shards()
+        self._sessions: Dict[int, Session] = {}
+
+    def shard(self, index: int) -> Session:
+        session = self._sessions.get(index)
+        if session is None:
+            if self.shards.engines[index] is self.main.get_bind():
+                session = self.main
+            else:
+                session = self.shards.session_factories[index]()
+            self._sessions[index] = session
+        return session
+
+    def for_email(self, email: str) -> Session:
+        return self.shard(self.shards.shard_index(email))
+
+    def all_shards(self) -> List[Session]:
+        return [self.shard(index) for index in range(len(self.shards))]
+
+    def close(self):
+        for session in self._sessions.values():
+            if session is not self.main:
+                session.close()
+        self._sessions.clear()
+
+
+def get_users_db(db: Session = Depends(get_db)):
+    users_db = UserShardSessions(db)
+    try:
+        yield users_db
+    finally:
+        users_db.close()
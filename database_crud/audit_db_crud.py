@@ -0,0 +1,19 @@
+import sys
+
+sys.path.append("..")
+
+from datetime import datetime
+from sqlalchemy.orm import Session
+from db_models import AuditEvent
+
+
+def get_audit_events(db: Session, user_email: str = None, since: datetime = None,
+                     until: datetime = None, limit: int = 100):
+    query = db.query(AuditEvent)
+    if user_email is not None:
+        query = query.filter(AuditEvent.user_email == user_email)
+    if since is not None:
+        query = query.filter(AuditEvent.created_at >= since)
+    if until is not None:
+        query = query.filter(AuditEvent.created_at < until)
+    return list(query.order_by(AuditEvent.created_at.desc()).limit(limit))
@@ -0,0 +1,120 @@
+import sys
+import uuid
+
+sys.path.append("..")
+
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from database import UserShardSessions
+from db_models import RefreshToken
+from authentication import create_refresh_token, hash_refresh_token, get_auth_settings
+from audit.audit_log import audit_log, AuditEventType
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+def _delete_expired_refresh_tokens(db: Session, now: datetime):
+    # A token is only kept to detect its reuse, which can no longer happen
+    # once it has expired. Deleting on every issue keeps the table at the
+    # tokens of the last expiry period, and the expires_at index makes it
+    # cheap when nothing has expired.
+    db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.expires_at < now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _token_shard(db: UserShardSessions, refresh_token: str) -> int:
+    # Tokens start with the index of the user shard they are stored on, so
+    # a refresh goes straight there. Tokens from before shards, or for a
+    # different shard count, are looked up on the first and not found.
+    shard_index, separator, _ = refresh_token.partition(".")
+    if separator and shard_index.isdigit() and int(shard_index) < len(db.shards):
+        return int(shard_index)
+    return 0
+
+
+def _new_refresh_token(db: Session, shard_index: int, email: str, family_id: str, now: datetime):
+    _delete_expired_refresh_tokens(db, now)
+    refresh_token, token_hash = create_refresh_token(prefix=f"{shard_index}.")
+    expires_at = now + timedelta(days=get_auth_settings().refresh_token_expire_days)
+    db.add(RefreshToken(
+        token_hash=token_hash,
+        user_email=email,
+        family_id=family_id,
+        expires_at=expires_at
+    ))
+    return refresh_token, token_hash
+
+
+def issue_refresh_token(db: UserShardSessions, email: str):
+    # Refresh tokens live on their user's shard, next to the password
+    # changes that revoke them.
+    shard_index = db.shards.shard_index(email)
+    shard = db.shard(shard_index)
+    refresh_token, _ = _new_refresh_token(shard, shard_index, email, uuid.uuid4().hex, datetime.utcnow())
+    shard.commit()
+    return refresh_token
+
+
+def rotate_refresh_token(db: UserShardSessions, refresh_token: str):
+    """
+    Exchanges a refresh token for a new one of the same family and returns
+    the owner's email with the new token. Presenting a token that was already
+    exchanged means it has leaked, so its whole family is revoked.
+    """
+    now = datetime.utcnow()
+    shard_index = _token_shard(db, refresh_token)
+    shard = db.shard(shard_index)
+    stored_token = shard.get(RefreshToken, hash_refresh_token(refresh_token))
+    if not stored_token or stored_token.revoked or stored_token.expires_at < now:
+        raise RefreshTokenError("Refresh token is invalid or expired")
+    email, family_id = stored_token.user_email, stored_token.family_id
+
+    new_refresh_token, new_token_hash = _new_refresh_token(shard, shard_index, email, family_id, now)
+    # Claiming the old token and checking it was unused is a single
+    # statement, so two concurrent refreshes cannot both succeed.
+    claimed = shard.execute(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == stored_token.token_hash, RefreshToken.replaced_by.is_(None))
+        .values(replaced_by=new_token_hash)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        shard.rollback()
+        revoke_refresh_token_family(shard, family_id)
+        audit_log.record(AuditEventType.REFRESH_TOKEN_REUSED, email)
+        raise RefreshTokenError("Refresh token has already been used")
+    shard.commit()
+    return email, new_refresh_token
+
+
+def revoke_refresh_token_family(db: Session, family_id: str):
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id)
+        .values(revoked=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def mark_user_refresh_tokens_revoked(db: Session, email: str):
+    # Runs inside the caller's transaction on the user's shard, so tokens
+    # are revoked in the same commit as the password change revoking them.
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_email == email, RefreshToken.revoked.is_(False))
+        .values(revoked=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def revoke_user_refresh_tokens(db: UserShardSessions, email: str):
+    shard = db.for_email(email)
+    mark_user_refresh_tokens_revoked(shard, email)
+    shard.commit()
@@ -0,0 +1,96 @@
+import sys
+from collections import defaultdict
+
+sys.path.append("..")
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+from database import UserShardSessions
+from db_models import RoleDefinition, RoleInheritance, RoleGrant, User
+import schemas as schemas
+from permissions.roles import ALL_PERMISSIONS, RolePermissions, flatten_role_permissions
+from database_crud.table_versions_db_crud import bump_table_version, get_table_version
+from audit.audit_log import audit_log, AuditEventType
+
+
+class RoleInUseError(Exception):
+    pass
+
+
+def get_roles_version(db: Session):
+    return get_table_version(db, RoleDefinition.__tablename__)
+
+
+def _load_roles(db: Session):
+    grants = {role.name: set() for role in db.query(RoleDefinition)}
+    parents = defaultdict(list)
+    for grant in db.query(RoleGrant):
+        grants[grant.role_name].add(grant.permission)
+    for inheritance in db.query(RoleInheritance):
+        parents[inheritance.role_name].append(inheritance.parent_name)
+    return grants, dict(parents)
+
+
+def load_role_permissions(db: Session) -> RolePermissions:
+    # The version is read first, so a concurrent write can only make the
+    # snapshot look older than it is and get reloaded on the next poll.
+    version = get_roles_version(db)
+    grants, parents = _load_roles(db)
+    return RolePermissions.build(version, grants, parents)
+
+
+def get_roles(db: Session):
+    grants, parents = _load_roles(db)
+    effective_permissions = flatten_role_permissions(grants, parents)
+    return [
+        schemas.RoleOut(
+            name=name,
+            permissions=sorted(grants[name]),
+            parents=sorted(parents.get(name, [])),
+            effective_permissions=sorted(effective_permissions[name])
+        )
+        for name in sorted(grants)
+    ]
+
+
+def put_role(db: Session, name: str, role: schemas.RoleIn, actor_email: str):
+    unknown_permissions = set(role.permissions) - ALL_PERMISSIONS
+    if unknown_permissions:
+        raise ValueError(f"Unknown permissions: {', '.join(sorted(unknown_permissions))}")
+
+    grants, parents = _load_roles(db)
+    grants[name] = set(role.permissions)
+    parents[name] = list(role.parents)
+    flatten_role_permissions(grants, parents)
+
+    if not db.get(RoleDefinition, name):
+        db.add(RoleDefinition(name=name))
+        db.flush()
+    db.execute(delete(RoleGrant).where(RoleGrant.role_name == name))
+    db.execute(delete(RoleInheritance).where(RoleInheritance.role_name == name))
+    if role.permissions:
+        db.execute(insert(RoleGrant), [
+            {"role_name": name, "permission": permission} for permission in set(role.permissions)])
+    if role.parents:
+        db.execute(insert(RoleInheritance), [
+            {"role_name": name, "parent_name": parent} for parent in set(role.parents)])
+    bump_table_version(db, RoleDefinition.__tablename__)
+    db.commit()
+    audit_log.record(
+        AuditEventType.ROLE_DEFINITION_CHANGED, actor_email,
+        f"{name} saved: permissions {sorted(set(role.permissions))}, parents {sorted(set(role.parents))}")
+
+
+def delete_role(db: Session, users_db: UserShardSessions, name: str, actor_email: str):
+    if not db.get(RoleDefinition, name):
+        raise ValueError(f"There is no role {name}")
+    if any(shard.query(User).filter(User.role == name).first() for shard in users_db.all_shards()):
+        raise RoleInUseError(f"Role {name} is still assigned to users")
+    if db.query(RoleInheritance).filter(RoleInheritance.parent_name == name).first():
+        raise RoleInUseError(f"Role {name} is inherited by other roles")
+    db.execute(delete(RoleGrant).where(RoleGrant.role_name == name))
+    db.execute(delete(RoleInheritance).where(RoleInheritance.role_name == name))
+    db.execute(delete(RoleDefinition).where(RoleDefinition.name == name))
+    bump_table_version(db, RoleDefinition.__tablename__)
+    db.commit()
+    audit_log.record(AuditEventType.ROLE_DEFINITION_CHANGED, actor_email, f"{name} deleted")
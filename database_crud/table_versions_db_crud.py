@@ -0,0 +1,25 @@
+import sys
+
+sys.path.append("..")
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert
+from db_models import TableVersion
+
+
+def bump_table_version(db: Session, name: str):
+    # Runs inside the caller's transaction, so the version only moves
+    # when the write it describes is committed.
+    statement = insert(TableVersion).values(name=name, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TableVersion.name],
+        set_={"version": TableVersion.version + 1}
+    )
+    db.execute(statement)
+
+
+def get_table_version(db: Session, name: str):
+    table_version = db.get(TableVersion, name)
+    if not table_version:
+        return 0
+    return table_version.version
@@ -1,21 +1,34 @@
 import sys
+import heapq
+import re
 import string
 import random
+from itertools import islice
 
 sys.path.append("..")
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Float, column, select, text
+from database import UserShardSessions
 from db_models import User
 import schemas as schemas
 from sqlalchemy.exc import IntegrityError
 from authentication import get_password_hash, verify_password
+from breached_passwords.policy import check_password_not_breached
+from audit.audit_log import audit_log, AuditEventType
+from database_crud.refresh_tokens_db_crud import mark_user_refresh_tokens_revoked
+from database_crud.table_versions_db_crud import bump_table_version, get_table_version
 
 
 class DuplicateError(Exception):
     pass
 
 
-def add_user(db: Session, user: schemas.UserSignUp):
+def get_users_version(db: UserShardSessions):
+    # One version per shard, since each shard bumps its own on writes.
+    return tuple(get_table_version(shard, User.__tablename__) for shard in db.all_shards())
+
+
+def add_user(db: UserShardSessions, user: schemas.UserSignUp):
     password = user.password
     if not password:
         characters = string.ascii_letters + string.digits + string.punctuation
@@ -28,77 +41,130 @@ def add_user(db: Session, user: schemas.UserSignUp):
         surname=user.surname,
         role=user.role
     )
+    shard = db.for_email(user.email)
     try:
-        db.add(user)
-        db.commit()
+        shard.add(user)
+        shard.flush()
+        bump_table_version(shard, User.__tablename__)
+        shard.commit()
         return user, password
     except IntegrityError:
-        db.rollback()
+        shard.rollback()
         raise DuplicateError(
             f"Email {user.email} is already attached to a registered user.")
 
 
-def get_user(db: Session, email: str):
-    user = db.query(User).filter(User.email == email).first()
+def get_user(db: UserShardSessions, email: str):
+    user = db.for_email(email).query(User).filter(User.email == email).first()
     if not user:
         return False
     return user
 
 
-def update_user(db: Session, email: str, user_update: schemas.UserUpdate):
-    user = db.query(User).filter(User.email == email).first()
+def update_user(db: UserShardSessions, email: str, user_update: schemas.UserUpdate):
+    shard = db.for_email(email)
+    user = shard.query(User).filter(User.email == email).first()
 
     if not user:
         raise ValueError(
             f"There isn't any user with username {email}")
 
+    previous_role = user.role
     updated_user = user_update.dict(exclude_unset=True)
     for key, value in updated_user.items():
         setattr(user, key, value)
-    db.commit()
+    bump_table_version(shard, User.__tablename__)
+    shard.commit()
+    if user.role != previous_role:
+        audit_log.record(AuditEventType.ROLE_CHANGED, email, f"{previous_role} -> {user.role}")
     return user
 
 
-def delete_user(db: Session, email: str):
-    user_cursor = db.query(User).filter(User.email == email)
+def delete_user(db: UserShardSessions, email: str):
+    shard = db.for_email(email)
+    user_cursor = shard.query(User).filter(User.email == email)
     if not user_cursor.first():
         raise ValueError(f"There is no user with email {email}")
     else:
         user_cursor.delete()
-        db.commit()
+        mark_user_refresh_tokens_revoked(shard, email)
+        bump_table_version(shard, User.__tablename__)
+        shard.commit()
 
 
-def user_change_password(db: Session, email: str, user_change_password_body: schemas.UserChangePassword):
-    user = db.query(User).filter(User.email == email).first()
+def user_change_password(db: UserShardSessions, email: str, user_change_password_body: schemas.UserChangePassword):
+    shard = db.for_email(email)
+    user = shard.query(User).filter(User.email == email).first()
 
     if not verify_password(user_change_password_body.old_password, user.password):
         raise ValueError(
             f"Old password provided doesn't match, please try again")
     user.password = get_password_hash(user_change_password_body.new_password)
-    db.commit()
+    mark_user_refresh_tokens_revoked(shard, email)
+    shard.commit()
+    audit_log.record(AuditEventType.PASSWORD_CHANGED, email)
 
 
-def user_reset_password(db: Session, email: str, new_password: str):
+def user_reset_password(db: UserShardSessions, email: str, new_password: str):
+    # The reset form posts the password directly, without a schema to
+    # validate it, so it is checked here.
+    check_password_not_breached(new_password)
     try:
-        user = db.query(User).filter(User.email == email).first()
+        shard = db.for_email(email)
+        user = shard.query(User).filter(User.email == email).first()
         user.password = get_password_hash(new_password)
-        db.commit()
+        mark_user_refresh_tokens_revoked(shard, email)
+        shard.commit()
     except Exception:
         return False
+    audit_log.record(AuditEventType.PASSWORD_RESET, email)
     return True
 
 
-def update_me(db: Session, email: str, user_update: schemas.UserUpdateMe):
-    user = db.query(User).filter(User.email == email).first()
+def update_me(db: UserShardSessions, email: str, user_update: schemas.UserUpdateMe):
+    shard = db.for_email(email)
+    user = shard.query(User).filter(User.email == email).first()
 
     updated_user = user_update.dict(exclude_unset=True)
     for key, value in updated_user.items():
         setattr(user, key, value)
-    db.commit()
+    bump_table_version(shard, User.__tablename__)
+    shard.commit()
     return user
 
 
-def get_users(db: Session):
-    users = list(db.query(User).all())
+def get_users(db: UserShardSessions):
+    # Every shard returns its users sorted by email, so merging the sorted
+    # streams gives one listing ordered the same way for any shard count.
+    users = list(heapq.merge(
+        *(shard.query(User).order_by(User.email) for shard in db.all_shards()),
+        key=lambda user: user.email
+    ))
     return users
 
+
+def _search_match_expression(query: str):
+    # Every word of the query has to match the start of a token in one of
+    # the indexed columns, e.g. "jo exam" finds "john@example.com".
+    terms = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_users(db: UserShardSessions, query: str, limit: int = 20):
+    match = _search_match_expression(query)
+    if not match:
+        return []
+    statement = select(User, column("search_rank", Float)).from_statement(text(
+        "SELECT users.*, users_search.rank AS search_rank FROM users_search "
+        "JOIN users ON users.rowid = users_search.rowid "
+        "WHERE users_search MATCH :match "
+        "ORDER BY users_search.rank LIMIT :limit"
+    ))
+    # Each shard returns its own best `limit` matches, best first; the
+    # overall best `limit` are among them. Ranks are computed per shard,
+    # so across shards the order is close to, not exactly, a single index.
+    matches = heapq.merge(
+        *(shard.execute(statement, {"match": match, "limit": limit}).all() for shard in db.all_shards()),
+        key=lambda row: row.search_rank
+    )
+    return [row[0] for row in islice(matches, limit)]
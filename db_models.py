@@ -1,6 +1,6 @@
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, insert, select
 from sqlalchemy.sql import func
-from database import Base
+from database import Base, engine, get_user_shards
 
 
 class User(Base):
@@ -11,7 +11,264 @@ class User(Base):
     surname = Column(String, nullable=True)
     role = Column(String)
     register_date = Column(DateTime, default=func.now())
+    version = Column(Integer, nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
 
     @property
     def as_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class AuditEvent(Base):
+    __tablename__ = "audit_events"
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, nullable=False)
+    event = Column(String, nullable=False)
+    detail = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (Index("ix_audit_events_user_email_created_at", "user_email", "created_at"),)
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    token_hash = Column(String, primary_key=True)
+    user_email = Column(String, nullable=False, index=True)
+    family_id = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    replaced_by = Column(String, nullable=True)
+    revoked = Column(Boolean, nullable=False, default=False)
+
+
+class RoleDefinition(Base):
+    __tablename__ = "roles"
+    name = Column(String, primary_key=True)
+
+
+class RoleInheritance(Base):
+    __tablename__ = "role_parents"
+    role_name = Column(String, ForeignKey("roles.name"), primary_key=True)
+    parent_name = Column(String, ForeignKey("roles.name"), primary_key=True)
+
+
+class RoleGrant(Base):
+    __tablename__ = "role_permissions"
+    role_name = Column(String, ForeignKey("roles.name"), primary_key=True)
+    permission = Column(String, primary_key=True)
+
+
+class KnownPermission(Base):
+    # Permissions from the code that the default roles have been offered,
+    # so that one revoked later is not granted again on the next upgrade.
+    __tablename__ = "known_permissions"
+    permission = Column(String, primary_key=True)
+
+
+# Full-text index over the searchable user columns. It is an external
+# content table keyed on the users rowid, so the triggers below keep it in
+# sync and it does not store a second copy of the rows. A VACUUM may
+# renumber those rowids, after which the index has to be rebuilt.
+USER_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(
+        email, name, surname,
+        content='users', content_rowid='rowid', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_search(rowid, email, name, surname)
+        VALUES (new.rowid, new.email, new.name, new.surname);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_search(users_search, rowid, email, name, surname)
+        VALUES ('delete', old.rowid, old.email, old.name, old.surname);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF email, name, surname ON users BEGIN
+        INSERT INTO users_search(users_search, rowid, email, name, surname)
+        VALUES ('delete', old.rowid, old.email, old.name, old.surname);
+        INSERT INTO users_search(rowid, email, name, surname)
+        VALUES (new.rowid, new.email, new.name, new.surname);
+    END
+    """,
+]
+
+
+def rebuild_user_search(connection):
+    connection.exec_driver_sql("INSERT INTO users_search(users_search) VALUES ('rebuild')")
+
+
+def _add_user_versions(connection):
+    Base.metadata.create_all(bind=connection, tables=[User.__table__, TableVersion.__table__])
+    # create_all leaves an existing users table alone, so databases from
+    # before row versions get the column here, starting every row at 1.
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(users)")}
+    if "version" not in columns:
+        connection.exec_driver_sql("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _add_table_versions(connection):
+    Base.metadata.create_all(bind=connection, tables=[TableVersion.__table__])
+
+
+def _add_user_search(connection):
+    for statement in USER_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    rebuild_user_search(connection)
+
+
+def _add_audit_events(connection):
+    Base.metadata.create_all(bind=connection, tables=[AuditEvent.__table__])
+
+
+def _add_refresh_tokens(connection):
+    Base.metadata.create_all(bind=connection, tables=[RefreshToken.__table__])
+
+
+def _add_refresh_token_expiry_index(connection):
+    for index in RefreshToken.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+def _add_roles(connection):
+    Base.metadata.create_all(
+        bind=connection, tables=[RoleDefinition.__table__, RoleInheritance.__table__, RoleGrant.__table__])
+    seed_default_roles(connection)
+
+
+def seed_default_roles(connection):
+    from permissions.roles import get_default_role_grants
+    grants = get_default_role_grants()
+    if connection.execute(RoleDefinition.__table__.select().limit(1)).first():
+        return
+    connection.execute(insert(RoleDefinition), [{"name": role} for role in grants])
+    connection.execute(insert(RoleGrant), [
+        {"role_name": role, "permission": permission}
+        for role, permissions in grants.items()
+        for permission in permissions
+    ])
+
+
+def grant_new_permissions(connection):
+    """
+    Grants the default roles that still exist the permissions the code
+    gives them and that were never offered before, then records those as
+    offered. Permissions offered once are never granted again, so an
+    administrator's revocation survives later upgrades.
+    """
+    from permissions.roles import get_default_role_grants
+    from database_crud.table_versions_db_crud import bump_table_version
+    grants = get_default_role_grants()
+    offered_permissions = {permission for permissions in grants.values() for permission in permissions}
+    KnownPermission.__table__.create(bind=connection, checkfirst=True)
+    known_permissions = set(connection.execute(select(KnownPermission.permission)).scalars())
+    if not known_permissions:
+        # Databases without a record yet were seeded from, or already
+        # offered, every default permission of this code.
+        connection.execute(insert(KnownPermission), [
+            {"permission": permission} for permission in sorted(offered_permissions)])
+        known_permissions = offered_permissions
+    existing_roles = set(connection.execute(select(RoleDefinition.name)).scalars())
+    held_grants = set(connection.execute(select(RoleGrant.role_name, RoleGrant.permission)).tuples())
+    new_grants = [
+        {"role_name": role, "permission": permission}
+        for role, permissions in grants.items() if role in existing_roles
+        for permission in permissions
+        if permission not in known_permissions and (role, permission) not in held_grants
+    ]
+    if new_grants:
+        connection.execute(insert(RoleGrant), new_grants)
+        bump_table_version(connection, RoleDefinition.__tablename__)
+    if offered_permissions - known_permissions:
+        connection.execute(insert(KnownPermission), [
+            {"permission": permission} for permission in sorted(offered_permissions - known_permissions)])
+
+
+# Upgrade steps by the schema version they bring a database to. Each step
+# only runs on databases below its version, in order, and user_version is
+# written once all of them have applied. Steps must be safe to run again
+# on a database they already upgraded. To change the schema, append a
+# step; never edit one that has shipped.
+SCHEMA_UPGRADES = [
+    (1, _add_user_versions),
+    (2, _add_user_search),
+    (3, _add_audit_events),
+    (4, _add_refresh_tokens),
+    (5, _add_roles),
+    # Append another grant_new_permissions step whenever the default roles
+    # gain a permission.
+    (6, grant_new_permissions),
+    (7, _add_refresh_token_expiry_index),
+]
+SCHEMA_VERSION = SCHEMA_UPGRADES[-1][0]
+
+# With users sharded the main database holds none of them, nor their
+# refresh tokens, only the versions table the roles use. Those steps are
+# replaced, or skipped when None, and the versions stay the same.
+_MAIN_WITHOUT_USERS_STEPS = {
+    _add_user_versions: _add_table_versions,
+    _add_user_search: None,
+    _add_refresh_tokens: None,
+    _add_refresh_token_expiry_index: None,
+}
+MAIN_WITHOUT_USERS_SCHEMA_UPGRADES = [
+    (version, _MAIN_WITHOUT_USERS_STEPS.get(upgrade, upgrade)) for version, upgrade in SCHEMA_UPGRADES
+]
+
+# A user shard holds users, their search index, the users version and
+# their refresh tokens; roles and audit events stay on the main database.
+USER_SHARD_SCHEMA_UPGRADES = [
+    (1, _add_user_versions),
+    (2, _add_user_search),
+    (3, _add_refresh_tokens),
+]
+
+
+def _upgrade_schema(bind, upgrades):
+    # pysqlite commits before every DDL statement of its own transactions,
+    # so the transaction is managed here instead. BEGIN IMMEDIATE takes the
+    # write lock before user_version is read: workers starting together
+    # upgrade one after the other, and a failing step rolls back the steps
+    # before it along with its own.
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            current_version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+            pending = [(version, upgrade) for version, upgrade in upgrades if version > current_version]
+            for version, upgrade in pending:
+                if upgrade is not None:
+                    upgrade(connection)
+            if pending:
+                connection.exec_driver_sql(f"PRAGMA user_version = {pending[-1][0]}")
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def create_schema(bind, users: bool = True):
+    _upgrade_schema(bind, SCHEMA_UPGRADES if users else MAIN_WITHOUT_USERS_SCHEMA_UPGRADES)
+
+
+def create_user_shard_schema(bind):
+    _upgrade_schema(bind, USER_SHARD_SCHEMA_UPGRADES)
+
+
+def create_schemas():
+    # Users are on the main database only when it is their single shard.
+    user_shards = get_user_shards()
+    create_schema(engine, users=engine in user_shards.engines)
+    for shard_engine in user_shards.engines:
+        if shard_engine is not engine:
+            create_user_shard_schema(shard_engine)
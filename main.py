@@ -2,13 +2,16 @@ import sys
 
 sys.path.append("..")
 
-import uvicorn
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from db_models import Base
-from database import engine
-from routers import users
+from db_models import create_schemas
+from authentication import get_auth_settings
+from routers import users, audit, roles, profiling, jwks
+from audit.audit_log import audit_log
+from permissions.role_watcher import role_permissions_watcher
+from profiling.middleware import ProfilingMiddleware
+from profiling.profiler import request_profiler
 
 
 description = """
@@ -18,8 +21,17 @@ An example FastAPI application to demonstrate forgot password flow.
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    # Settings are read lazily, so missing ones are reported here, before
+    # serving, rather than on the first authenticated request.
+    get_auth_settings()
+    create_schemas()
+    role_permissions_watcher.start()
+    audit_log.start()
     yield
+    await audit_log.stop()
+    await role_permissions_watcher.stop()
+    if request_profiler.summary():
+        request_profiler.write_profiles()
 
 
 app = FastAPI(
@@ -43,8 +55,15 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
 app.include_router(users.router)
+app.include_router(audit.router)
+app.include_router(roles.router)
+app.include_router(profiling.router)
+app.include_router(jwks.router)
 
 
 if __name__ == '__main__':
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=9999)
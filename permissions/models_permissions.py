@@ -8,3 +8,15 @@ class Users(ModelPermissionsMixin):
         'CHANGE_PASSWORD',
         'VIEW_ROLES'
     ]
+
+
+class AuditEvents(ModelPermissionsMixin):
+    pass
+
+
+class Roles(ModelPermissionsMixin):
+    pass
+
+
+class Profiling(ModelPermissionsMixin):
+    pass
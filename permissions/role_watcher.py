@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from contextlib import suppress
+from database import SessionLocal
+from database_crud import roles_db_crud
+from permissions.roles import get_role_permissions_snapshot, set_role_permissions_snapshot
+
+logger = logging.getLogger("uvicorn")
+
+
+class RolePermissionsWatcher:
+    """
+    Keeps this worker's role permissions snapshot in line with the database.
+
+    Every `poll_interval` seconds it reads the roles version, a single
+    primary key lookup, and only reloads roles and grants when the version
+    moved. Permission checks themselves never touch the database.
+    """
+
+    def __init__(self, poll_interval: float = 5.0):
+        self.poll_interval = poll_interval
+        self._task = None
+
+    def refresh(self, force: bool = False):
+        db = SessionLocal()
+        try:
+            current = get_role_permissions_snapshot()
+            if not force and roles_db_crud.get_roles_version(db) == current.version:
+                return False
+            set_role_permissions_snapshot(roles_db_crud.load_role_permissions(db))
+            return True
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error("Something went wrong refreshing role permissions")
+                logger.error(str(e))
+
+    def start(self):
+        self.refresh(force=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+
+role_permissions_watcher = RolePermissionsWatcher()
@@ -1,6 +1,9 @@
+import json
 from enum import Enum
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Tuple
+from attr import dataclass
 from permissions.models_permissions import *
-from typing import List
 
 
 class Role(str, Enum):
@@ -15,9 +18,15 @@ class Role(str, Enum):
         return values
 
 
+# Roles a new database is seeded with. Once seeded, roles and their grants
+# are managed through the database, and only permissions added to the code
+# later are granted from here, once, by a grant_new_permissions upgrade step.
 ROLE_PERMISSIONS = {
     Role.ADMINISTRATOR: [
         Users.permissions.FULL_PERMISSIONS,
+        AuditEvents.permissions.FULL_PERMISSIONS,
+        Roles.permissions.FULL_PERMISSIONS,
+        Profiling.permissions.FULL_PERMISSIONS,
     ],
     Role.USER: [
         [
@@ -28,10 +37,88 @@ ROLE_PERMISSIONS = {
     ]
 }
 
+ALL_PERMISSIONS = frozenset(
+    str(permission)
+    for model in (Users, AuditEvents, Roles, Profiling)
+    for permission in model.permissions.FULL_PERMISSIONS
+)
 
-def get_role_permissions(role: Role):
-    permissions = set()
-    for permissions_group in ROLE_PERMISSIONS[role]:
-        for permission in permissions_group:
-            permissions.add(str(permission))
-    return list(permissions)
+
+def get_default_role_grants() -> Dict[str, List[str]]:
+    grants = {}
+    for role, permissions_groups in ROLE_PERMISSIONS.items():
+        grants[role.value] = sorted(
+            {str(permission) for permissions_group in permissions_groups for permission in permissions_group})
+    return grants
+
+
+def flatten_role_permissions(grants: Mapping[str, Iterable[str]],
+                             parents: Mapping[str, Iterable[str]]) -> Dict[str, FrozenSet[str]]:
+    """
+    Resolves every role to the permissions granted to it directly or
+    through any of its ancestors. Raises ValueError on unknown parents
+    and on inheritance cycles.
+    """
+    resolved = {}
+
+    def resolve(role, path):
+        if role in resolved:
+            return resolved[role]
+        if role in path:
+            raise ValueError(f"Role inheritance cycle: {' -> '.join([*path, role])}")
+        permissions = set(grants.get(role, ()))
+        for parent in parents.get(role, ()):
+            if parent not in grants:
+                raise ValueError(f"Role {role} inherits from unknown role {parent}")
+            permissions |= resolve(parent, [*path, role])
+        resolved[role] = frozenset(permissions)
+        return resolved[role]
+
+    for role in grants:
+        resolve(role, [])
+    return resolved
+
+
+@dataclass(frozen=True)
+class RolePermissions:
+    """
+    Immutable, flattened view of all roles at a given roles version.
+    A new instance replaces the current one whenever the version changes,
+    so readers never see a partially updated set of roles.
+    """
+    version: int
+    permissions: Mapping[str, FrozenSet[str]]
+    role_names: Tuple[str, ...]
+    roles_response_body: bytes
+
+    @classmethod
+    def build(cls, version: int, grants: Mapping[str, Iterable[str]],
+              parents: Mapping[str, Iterable[str]]) -> "RolePermissions":
+        permissions = flatten_role_permissions(grants, parents)
+        role_names = tuple(sorted(permissions))
+        return cls(
+            version=version,
+            permissions=MappingProxyType(permissions),
+            role_names=role_names,
+            roles_response_body=json.dumps(list(role_names)).encode()
+        )
+
+
+_role_permissions = RolePermissions.build(0, get_default_role_grants(), {})
+
+
+def get_role_permissions_snapshot() -> RolePermissions:
+    return _role_permissions
+
+
+def set_role_permissions_snapshot(role_permissions: RolePermissions):
+    global _role_permissions
+    _role_permissions = role_permissions
+
+
+def get_role_permissions(role: str) -> FrozenSet[str]:
+    return _role_permissions.permissions.get(role, frozenset())
+
+
+def get_roles() -> Tuple[str, ...]:
+    return _role_permissions.role_names
@@ -0,0 +1,61 @@
+from starlette.routing import Match
+from authentication import get_auth_settings
+from profiling.profiler import PROFILE_HEADER, RequestProfiler, active_profile_var, verify_profile_request
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a fraction of requests, or any request carrying a valid
+    signed X-Profile-Request header. While profiling is disabled and the
+    header is absent, a request costs one attribute check and a scan of
+    its header names.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+        profiler.middleware_code = self._profiled_call.__code__
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        signed = False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                signed = verify_profile_request(get_auth_settings().secret_key, value.decode("latin-1"))
+                break
+        if not signed and not self.profiler.enabled:
+            return await self.app(scope, receive, send)
+
+        route = f"{scope['method']} {self._route_path(scope['app'].routes, scope) or scope['path']}"
+        if signed or self.profiler.should_sample(route):
+            return await self._profiled_call(scope, receive, send, route)
+        return await self.app(scope, receive, send)
+
+    async def _profiled_call(self, scope, receive, send, route):
+        # The sampler recognises this frame and reads `active_profile` from
+        # it, and worker threads find it through the copied context.
+        active_profile = self.profiler.begin(route)
+        token = active_profile_var.set(active_profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            active_profile_var.reset(token)
+            self.profiler.end(active_profile)
+
+    @classmethod
+    def _route_path(cls, routes, scope):
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match != Match.FULL:
+                continue
+            if hasattr(route, "path"):
+                return route.path
+            # Routers included into the app are matched as a whole first.
+            included_router = getattr(route, "original_router", None)
+            if included_router is not None:
+                path = cls._route_path(included_router.routes, scope)
+                if path:
+                    return path
+        return None
@@ -0,0 +1,214 @@
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import Context, ContextVar
+from functools import lru_cache
+from typing import Dict, Optional
+
+
+# Innermost matching frame decides where a sample's time is attributed.
+CATEGORY_MODULE_PREFIXES = [
+    ("bcrypt", ("passlib", "bcrypt")),
+    ("jwt", ("jose",)),
+    ("sqlalchemy", ("sqlalchemy",)),
+    ("smtp", ("fastapi_mail", "aiosmtplib", "smtplib")),
+]
+
+PROFILE_HEADER = b"x-profile-request"
+
+
+@lru_cache
+def get_profiling_output_dir() -> str:
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.environ.get("PROFILING_OUTPUT_DIR") or "profiles"
+
+active_profile_var: ContextVar = ContextVar("active_profile", default=None)
+
+
+class ActiveProfile:
+    __slots__ = ("route",)
+
+    def __init__(self, route: str):
+        self.route = route
+
+
+def _module_name(frame) -> str:
+    return frame.f_globals.get("__name__", "?")
+
+
+def _categorize(frames) -> str:
+    for frame in reversed(frames):
+        module_name = _module_name(frame)
+        for category, prefixes in CATEGORY_MODULE_PREFIXES:
+            if module_name.startswith(prefixes):
+                return category
+    return "other"
+
+
+class RequestProfiler:
+    """
+    Samples the stacks of requests picked for profiling and aggregates them
+    per route into collapsed stacks, the input format of flamegraph tools.
+
+    A background thread wakes up every `sample_interval` seconds while at
+    least one profiled request is in flight. A stack belongs to a request
+    when it runs inside the profiling middleware on the event loop thread,
+    or when it runs in a worker thread whose copied context carries that
+    request's ActiveProfile, which is how sync endpoints and dependencies
+    are executed.
+    """
+
+    def __init__(self, sample_interval: float = 0.001, output_dir: Optional[str] = None):
+        self.sample_interval = sample_interval
+        self.output_dir = output_dir
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.route_sample_rates: Dict[str, float] = {}
+        self.middleware_code = None
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stacks = defaultdict(Counter)
+        self._categories = defaultdict(Counter)
+        self._requests = Counter()
+
+    def configure(self, enabled: bool, sample_rate: float, route_sample_rates: Optional[Dict[str, float]] = None):
+        self.sample_rate = sample_rate
+        self.route_sample_rates = dict(route_sample_rates or {})
+        self.enabled = enabled
+
+    def should_sample(self, route: str) -> bool:
+        sample_rate = self.route_sample_rates.get(route, self.sample_rate)
+        return sample_rate > 0 and random.random() < sample_rate
+
+    def begin(self, route: str) -> ActiveProfile:
+        active_profile = ActiveProfile(route)
+        with self._lock:
+            self._active.add(active_profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return active_profile
+
+    def end(self, active_profile: ActiveProfile):
+        with self._lock:
+            self._active.discard(active_profile)
+            self._requests[active_profile.route] += 1
+
+    def _run(self):
+        own_thread_id = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            self._sample(own_thread_id)
+            time.sleep(self.sample_interval)
+
+    def _owner(self, frame):
+        """
+        Returns the ActiveProfile a thread's stack belongs to, along with the
+        frames from the request boundary down to the innermost one.
+        """
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        for index, frame in enumerate(frames):
+            code = frame.f_code
+            if code is self.middleware_code:
+                active_profile = frame.f_locals.get("active_profile")
+            elif code.co_name == "run" and "context" in code.co_varnames:
+                context = frame.f_locals.get("context")
+                if not isinstance(context, Context):
+                    continue
+                active_profile = context.get(active_profile_var)
+            else:
+                continue
+            if active_profile in self._active:
+                return active_profile, frames[index + 1:]
+        return None, None
+
+    def _sample(self, own_thread_id: int):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            active_profile, frames = self._owner(frame)
+            if active_profile is None or not frames:
+                continue
+            category = _categorize(frames)
+            stack = ";".join(f"{_module_name(frame)}:{frame.f_code.co_name}" for frame in frames)
+            with self._lock:
+                self._stacks[active_profile.route][f"{category};{stack}"] += 1
+                self._categories[active_profile.route][category] += 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                route: {
+                    "requests": self._requests[route],
+                    "samples": sum(categories.values()),
+                    "milliseconds": {
+                        category: round(samples * self.sample_interval * 1000, 1)
+                        for category, samples in categories.most_common()
+                    }
+                }
+                for route, categories in self._categories.items()
+            }
+
+    def write_profiles(self):
+        """
+        Writes one collapsed stacks file per route, whose first frame is the
+        time category, and a summary.json next to them.
+        """
+        output_dir = self.output_dir or get_profiling_output_dir()
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        with self._lock:
+            stacks = {route: Counter(counts) for route, counts in self._stacks.items()}
+        for route, counts in stacks.items():
+            file_name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") + ".collapsed"
+            path = os.path.join(output_dir, file_name)
+            with open(path, "w") as file:
+                for stack, samples in counts.most_common():
+                    file.write(f"{stack} {samples}\n")
+            paths.append(path)
+        summary_path = os.path.join(output_dir, "summary.json")
+        with open(summary_path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+        paths.append(summary_path)
+        return paths
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._categories.clear()
+            self._requests.clear()
+
+
+def sign_profile_request(secret_key: str, expires_in: int = 300) -> str:
+    expires = int(time.time()) + expires_in
+    signature = hmac.new(secret_key.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_request(secret_key: str, value: str) -> bool:
+    expires, _, signature = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret_key.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+request_profiler = RequestProfiler()
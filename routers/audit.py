@@ -0,0 +1,35 @@
+import sys
+
+sys.path.append("..")
+
+from fastapi import Depends, APIRouter, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+from authentication import PermissionChecker
+from permissions.models_permissions import AuditEvents
+from database import get_db
+from database_crud import audit_db_crud as db_crud
+from schemas import AuditEventOut
+from audit.audit_log import audit_log
+
+
+router = APIRouter(prefix="/v1")
+
+
+@router.get("/audit_events",
+            dependencies=[Depends(PermissionChecker([AuditEvents.permissions.VIEW_LIST]))],
+            response_model=List[AuditEventOut], summary="Get audit events", tags=["Audit"])
+def get_audit_events(user_email: Optional[str] = None, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, limit: int = Query(100, ge=1, le=1000),
+                     db: Session = Depends(get_db)):
+    """
+    Returns audit events, newest first, optionally for a single user
+    and within [since, until).
+    """
+    try:
+        audit_log.flush()
+        return db_crud.get_audit_events(db, user_email, since, until, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
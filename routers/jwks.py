@@ -0,0 +1,34 @@
+import sys
+
+sys.path.append("..")
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from signing_keys import get_keyset
+from etags import etag_matches, make_etag
+
+
+router = APIRouter()
+
+EMPTY_JWKS_BODY = b'{"keys": []}'
+
+
+@router.get("/.well-known/jwks.json", summary="Get the public keys access tokens are signed with",
+            tags=["Authentication"])
+def get_jwks(request: Request):
+    """
+    Returns the JSON Web Key Set other services verify access tokens with.
+    It can be cached for the max-age it is served with.
+    """
+    try:
+        keyset = get_keyset()
+        if keyset is None:
+            body, etag, max_age = EMPTY_JWKS_BODY, make_etag(EMPTY_JWKS_BODY), 300
+        else:
+            body, etag, max_age = keyset.jwks_body, keyset.jwks_etag, keyset.jwks_max_age
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
@@ -0,0 +1,71 @@
+import sys
+
+sys.path.append("..")
+
+from fastapi import Depends, APIRouter, HTTPException
+from authentication import PermissionChecker
+from permissions.models_permissions import Profiling
+from profiling.profiler import request_profiler
+from schemas import ProfilingSettings
+
+
+router = APIRouter(prefix="/v1")
+
+
+@router.get("/profiling",
+            dependencies=[Depends(PermissionChecker([Profiling.permissions.VIEW_DETAILS]))],
+            summary="Get profiling settings and per route results", tags=["Profiling"])
+def get_profiling():
+    """
+    Returns the profiling settings and, per route, the number of profiled
+    requests and the sampled time spent in bcrypt, JWT, SQLAlchemy, SMTP
+    and everything else.
+    """
+    try:
+        return {
+            "enabled": request_profiler.enabled,
+            "sample_rate": request_profiler.sample_rate,
+            "route_sample_rates": request_profiler.route_sample_rates,
+            "routes": request_profiler.summary()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
+@router.put("/profiling",
+            dependencies=[Depends(PermissionChecker([Profiling.permissions.EDIT]))],
+            summary="Change profiling settings", tags=["Profiling"])
+def put_profiling(profiling_settings: ProfilingSettings):
+    """
+    Switches profiling on or off. Route sample rates are keyed like
+    `GET /v1/users` and override the default sample rate.
+    """
+    try:
+        request_profiler.configure(
+            profiling_settings.enabled,
+            profiling_settings.sample_rate,
+            profiling_settings.route_sample_rates
+        )
+        return {"result": f"Profiling has been {'enabled' if profiling_settings.enabled else 'disabled'}!"}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
+@router.post("/profiling/flush",
+             dependencies=[Depends(PermissionChecker([Profiling.permissions.EDIT]))],
+             summary="Write collapsed stack files", tags=["Profiling"])
+def flush_profiling(reset: bool = False):
+    """
+    Writes the collapsed stacks gathered so far, one file per route, and
+    optionally starts over.
+    """
+    try:
+        paths = request_profiler.write_profiles()
+        if reset:
+            request_profiler.reset()
+        return {"files": paths}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
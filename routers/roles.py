@@ -0,0 +1,73 @@
+import sys
+
+sys.path.append("..")
+
+from fastapi import Depends, APIRouter, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from authentication import PermissionChecker
+from permissions.models_permissions import Roles
+from permissions.role_watcher import role_permissions_watcher
+from database import UserShardSessions, get_db, get_users_db
+from database_crud import roles_db_crud as db_crud
+from schemas import RoleIn, RoleOut, User
+
+
+router = APIRouter(prefix="/v1")
+
+
+@router.get("/roles",
+            dependencies=[Depends(PermissionChecker([Roles.permissions.VIEW_LIST]))],
+            response_model=List[RoleOut], summary="Get all roles with their permissions", tags=["Roles"])
+def get_roles(db: Session = Depends(get_db)):
+    """
+    Returns all roles with their own permissions, the roles they inherit
+    from and the permissions they end up with.
+    """
+    try:
+        return db_crud.get_roles(db)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
+@router.put("/roles/{role_name}",
+            summary="Create or replace a role", tags=["Roles"])
+def put_role(role_name: str, role: RoleIn, db: Session = Depends(get_db),
+             user: User = Depends(PermissionChecker([Roles.permissions.CREATE, Roles.permissions.EDIT]))):
+    """
+    Creates a role, or replaces the permissions and parents of an existing one.
+    """
+    try:
+        db_crud.put_role(db, role_name, role, user.email)
+        role_permissions_watcher.refresh()
+        return {"result": f"Role {role_name} has been saved successfully!"}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail=f"{e}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
+@router.delete("/roles/{role_name}",
+               summary="Delete a role", tags=["Roles"])
+def delete_role(role_name: str, db: Session = Depends(get_db),
+                users_db: UserShardSessions = Depends(get_users_db),
+                user: User = Depends(PermissionChecker([Roles.permissions.DELETE]))):
+    """
+    Deletes a role that is neither assigned to users nor inherited.
+    """
+    try:
+        db_crud.delete_role(db, users_db, role_name, user.email)
+        role_permissions_watcher.refresh()
+        return {"result": f"Role {role_name} has been deleted successfully!"}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=404, detail=f"{e}")
+    except db_crud.RoleInUseError as e:
+        raise HTTPException(
+            status_code=409, detail=f"{e}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
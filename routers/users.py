@@ -2,26 +2,35 @@ import sys
 
 sys.path.append("..")
 
-from fastapi import Depends, APIRouter, HTTPException, Request, Form
-from sqlalchemy.orm import Session
+from fastapi import Depends, APIRouter, HTTPException, Request, Response, Form, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import List
 from authentication import PermissionChecker, create_access_token,\
     authenticate_user, get_current_user, get_user_by_email, get_current_user_via_temp_token
 from permissions.models_permissions import Users
-from permissions.roles import get_role_permissions, Role
-from database import get_db
+from permissions.roles import get_role_permissions, get_role_permissions_snapshot
+from database import UserShardSessions, get_users_db
 from database_crud import users_db_crud as db_crud
-from schemas import User, UserSignUp, UserChangePassword, UserOut, UserMe, Token, UserUpdate, UserUpdateMe
+from database_crud import refresh_tokens_db_crud
+from schemas import User, UserSignUp, UserChangePassword, UserOut, UserMe, Token, UserUpdate, UserUpdateMe, \
+    RefreshTokenRequest
 from email_notifications.notify import send_registration_notification, send_reset_password_mail
+from audit.audit_log import audit_log, AuditEventType
+from etags import make_etag, etag_matches, not_modified, cache_headers
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from functools import lru_cache
 from pathlib import Path
 
 
 parent_directory = Path(__file__).parent
 templates_path = parent_directory.parent / "templates"
-templates = Jinja2Templates(directory=templates_path)
+
+
+@lru_cache
+def get_templates():
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=templates_path)
+
 
 
 router = APIRouter(prefix="/v1")
@@ -30,7 +39,7 @@ router = APIRouter(prefix="/v1")
 @router.post("/users",
              dependencies=[Depends(PermissionChecker([Users.permissions.CREATE]))],
              response_model=UserOut, summary="Register a user", tags=["Users"])
-async def create_user(user_signup: UserSignUp, db: Session = Depends(get_db)):
+async def create_user(user_signup: UserSignUp, db: UserShardSessions = Depends(get_users_db)):
     """
     Registers a user.
     """
@@ -43,6 +52,8 @@ async def create_user(user_signup: UserSignUp, db: Session = Depends(get_db)):
         return user_created
     except db_crud.DuplicateError as e:
         raise HTTPException(status_code=403, detail=f"{e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
@@ -51,23 +62,45 @@ async def create_user(user_signup: UserSignUp, db: Session = Depends(get_db)):
 @router.get("/users",
             dependencies=[Depends(PermissionChecker([Users.permissions.VIEW_LIST]))],
             response_model=List[UserOut], summary="Get all users", tags=["Users"])
-def get_users(db: Session = Depends(get_db)):
+def get_users(request: Request, response: Response, db: UserShardSessions = Depends(get_users_db)):
     """
     Returns all users.
     """
     try:
+        # The version is read before the users, so a concurrent write can only
+        # make the ETag older than the body, never newer.
+        etag = make_etag("users", *db_crud.get_users_version(db))
+        if etag_matches(request, etag):
+            return not_modified(etag)
         users = db_crud.get_users(db)
+        response.headers.update(cache_headers(etag))
         return users
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
 
 
+@router.get("/users/search",
+            dependencies=[Depends(PermissionChecker([Users.permissions.VIEW_LIST]))],
+            response_model=List[UserOut], summary="Search users", tags=["Users"])
+def search_users(q: str = Query(min_length=1), limit: int = Query(20, ge=1, le=100),
+                 db: UserShardSessions = Depends(get_users_db)):
+    """
+    Returns the users whose email, name or surname start with the words
+    given, best matches first.
+    """
+    try:
+        return db_crud.search_users(db, q, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
 @router.patch("/users",
               dependencies=[Depends(PermissionChecker([Users.permissions.VIEW_DETAILS, Users.permissions.EDIT]))],
               response_model=UserOut,
               summary="Update a user", tags=["Users"])
-def update_user(user_email: str, user_update: UserUpdate, db: Session = Depends(get_db)):
+def update_user(user_email: str, user_update: UserUpdate, db: UserShardSessions = Depends(get_users_db)):
     """
     Updates a user.
     """
@@ -85,7 +118,7 @@ def update_user(user_email: str, user_update: UserUpdate, db: Session = Depends(
 @router.delete("/users",
                dependencies=[Depends(PermissionChecker([Users.permissions.DELETE]))],
                summary="Delete a user", tags=["Users"])
-def delete_user(user_email: str, db: Session = Depends(get_db)):
+def delete_user(user_email: str, db: UserShardSessions = Depends(get_users_db)):
     """
     Deletes a user.
     """
@@ -102,13 +135,22 @@ def delete_user(user_email: str, db: Session = Depends(get_db)):
 
 @router.get("/users/roles",
             dependencies=[Depends(PermissionChecker([Users.permissions.VIEW_ROLES]))],
-            response_model=List[Role], summary="Get all user roles", tags=["Users"])
-def get_user_roles(db: Session = Depends(get_db)):
+            response_model=List[str], summary="Get all user roles", tags=["Users"])
+def get_user_roles(request: Request):
     """
     Returns all user roles.
     """
     try:
-        return Role.get_roles()
+        # The body is built once per roles version, when the snapshot is.
+        role_permissions = get_role_permissions_snapshot()
+        etag = make_etag("roles", role_permissions.version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return Response(
+            content=role_permissions.roles_response_body,
+            media_type="application/json",
+            headers=cache_headers(etag)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
@@ -116,20 +158,24 @@ def get_user_roles(db: Session = Depends(get_db)):
 
 @router.get("/users/me",
             response_model=UserMe, summary="Get info for my account", tags=["Users"])
-def get_users(user: User = Depends(PermissionChecker([Users.permissions.VIEW_ME]))):
+def get_me(request: Request, response: Response,
+           user: User = Depends(PermissionChecker([Users.permissions.VIEW_ME]))):
     """
     Returns info of logged in account.
     """
     try:
+        etag = make_etag(user.email, user.version, get_role_permissions_snapshot().version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         user = UserMe(
             email=user.email,
             name=user.name,
             surname=user.surname,
-            title=user.title,
             register_date=user.register_date,
-            roles=user.role,
-            permissions=get_role_permissions(user.role)
+            role=user.role,
+            permissions=sorted(get_role_permissions(user.role))
         )
+        response.headers.update(cache_headers(etag))
         return user
     except Exception as e:
         raise HTTPException(
@@ -141,7 +187,7 @@ def get_users(user: User = Depends(PermissionChecker([Users.permissions.VIEW_ME]
               response_model=UserMe,
               summary="Change details for a logged in user", tags=["Users"])
 def update_me(user_update: UserUpdateMe, user: User = Depends(get_current_user),
-                         db: Session = Depends(get_db)):
+                         db: UserShardSessions = Depends(get_users_db)):
     """
     Changes details for a logged in user.
     """
@@ -151,10 +197,9 @@ def update_me(user_update: UserUpdateMe, user: User = Depends(get_current_user),
             email=user.email,
             name=user.name,
             surname=user.surname,
-            title=user.title,
             register_date=user.register_date,
-            roles=user.roles,
-            permissions=get_role_permissions(user.role)
+            role=user.role,
+            permissions=sorted(get_role_permissions(user.role))
         )
         return user
     except ValueError as e:
@@ -169,7 +214,7 @@ def update_me(user_update: UserUpdateMe, user: User = Depends(get_current_user),
               dependencies=[Depends(PermissionChecker([Users.permissions.CHANGE_PASSWORD]))],
               summary="Change password for a logged in user", tags=["Users"])
 def user_change_password(user_change_password_body: UserChangePassword, user: User = Depends(get_current_user),
-                         db: Session = Depends(get_db)):
+                         db: UserShardSessions = Depends(get_users_db)):
     """
     Changes password for a logged in user.
     """
@@ -184,25 +229,64 @@ def user_change_password(user_change_password_body: UserChangePassword, user: Us
             status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
 
 
+@router.delete("/users/me/refresh_tokens",
+               dependencies=[Depends(PermissionChecker([Users.permissions.EDIT_ME]))],
+               summary="Revoke all refresh tokens of a logged in user", tags=["Users"])
+def revoke_my_refresh_tokens(user: User = Depends(get_current_user),
+                             db: UserShardSessions = Depends(get_users_db)):
+    """
+    Revokes all refresh tokens of a logged in user, signing out every client
+    once its current access token expires.
+    """
+    try:
+        refresh_tokens_db_crud.revoke_user_refresh_tokens(db, user.email)
+        return {"result": f"{user.name} your refresh tokens have been revoked!"}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
+@router.delete("/users/refresh_tokens",
+               dependencies=[Depends(PermissionChecker([Users.permissions.EDIT]))],
+               summary="Revoke all refresh tokens of a user", tags=["Users"])
+def revoke_user_refresh_tokens(user_email: str, db: UserShardSessions = Depends(get_users_db)):
+    """
+    Revokes all refresh tokens of a user.
+    """
+    try:
+        refresh_tokens_db_crud.revoke_user_refresh_tokens(db, user_email)
+        return {"result": f"Refresh tokens of user with email {user_email} have been revoked!"}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
 @router.post("/users/me/reset_password",
               summary="Resets password for a user", tags=["Users"])
 def user_reset_password(request: Request, new_password: str = Form(...), user: User = Depends(get_current_user_via_temp_token),
-                         db: Session = Depends(get_db)):
+                         db: UserShardSessions = Depends(get_users_db)):
     """
     Resets password for a user.
     """
     try:
         result = db_crud.user_reset_password(db, user.email, new_password)
-        return templates.TemplateResponse(
+        return get_templates().TemplateResponse(
+            request,
             "reset_password_result.html",
             {
-                "request": request,
                 "success": result
             }
         )
     except ValueError as e:
-        raise HTTPException(
-            status_code=400, detail=f"{e}")
+        return get_templates().TemplateResponse(
+            request,
+            "reset_password_result.html",
+            {
+                "success": False,
+                "error": f"{e}"
+            },
+            status_code=400
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
@@ -217,10 +301,10 @@ def user_reset_password_template(request: Request, user: User = Depends(get_curr
     """
     try:
         token = request.query_params.get('access_token')
-        return templates.TemplateResponse(
+        return get_templates().TemplateResponse(
+            request,
             "reset_password.html",
             {
-                "request": request, 
                 "user": user, 
                 "access_token": token
             }
@@ -232,7 +316,7 @@ def user_reset_password_template(request: Request, user: User = Depends(get_curr
 
 @router.post("/users/me/forgot_password",
               summary="Trigger forgot password mechanism for a user", tags=["Users"])
-async def user_forgot_password(request: Request, user_email: str, db: Session = Depends(get_db)):
+async def user_forgot_password(request: Request, user_email: str, db: UserShardSessions = Depends(get_users_db)):
     """
     Triggers forgot password mechanism for a user.
     """
@@ -252,19 +336,46 @@ async def user_forgot_password(request: Request, user_email: str, db: Session =
 
 
 @router.post("/token", response_model=Token, summary="Authorize as a user", tags=["Users"])
-def authorize(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def authorize(form_data: OAuth2PasswordRequestForm = Depends(), db: UserShardSessions = Depends(get_users_db)):
     """
     Logs in a user.
     """
     user = authenticate_user(db=db, user_email=form_data.username, password=form_data.password)
     if not user:
+        audit_log.record(AuditEventType.LOGIN_FAILED, form_data.username)
         raise HTTPException(
             status_code=401, detail="Invalid user email or password.")
+    audit_log.record(AuditEventType.LOGIN, user.email)
     try:
         access_token = create_access_token(data=user.email)
+        refresh_token = refresh_tokens_db_crud.issue_refresh_token(db, user.email)
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": refresh_token
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"An unexpected error occurred. Report this message to support: {e}")
+
+
+@router.post("/token/refresh", response_model=Token, summary="Refresh an access token", tags=["Users"])
+def refresh(refresh_token_body: RefreshTokenRequest, db: UserShardSessions = Depends(get_users_db)):
+    """
+    Exchanges a refresh token for a new access token and a new refresh token.
+    Each refresh token can only be used once.
+    """
+    try:
+        user_email, refresh_token = refresh_tokens_db_crud.rotate_refresh_token(
+            db, refresh_token_body.refresh_token)
+    except refresh_tokens_db_crud.RefreshTokenError as e:
+        raise HTTPException(status_code=401, detail=f"{e}")
+    try:
+        access_token = create_access_token(data=user_email)
         return {
             "access_token": access_token,
-            "token_type": "bearer"
+            "token_type": "bearer",
+            "refresh_token": refresh_token
         }
     except Exception as e:
         raise HTTPException(
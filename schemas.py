@@ -1,7 +1,14 @@
-from pydantic import BaseModel, EmailStr
-from datetime import date
-from typing import Optional, List
-from permissions.roles import Role
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from datetime import date, datetime
+from typing import Optional, List, Dict
+from permissions.roles import get_roles
+from breached_passwords.policy import check_password_not_breached
+
+
+def check_role_exists(role):
+    if role is not None and role not in get_roles():
+        raise ValueError(f"Unknown role {role}")
+    return role
 
 
 class UserSignUp(BaseModel):
@@ -9,13 +16,30 @@ class UserSignUp(BaseModel):
     password: Optional[str]
     name: str
     surname: Optional[str] = None
-    role: Role
+    role: str
+
+    @field_validator("role")
+    @classmethod
+    def role_exists(cls, role):
+        return check_role_exists(role)
+
+    @field_validator("password")
+    @classmethod
+    def password_not_breached(cls, password):
+        if password:
+            check_password_not_breached(password)
+        return password
 
 
 class UserUpdate(BaseModel):
     name: Optional[str]
     surname: Optional[str]
-    role: Optional[Role]
+    role: Optional[str]
+
+    @field_validator("role")
+    @classmethod
+    def role_exists(cls, role):
+        return check_role_exists(role)
 
 
 class UserUpdateMe(BaseModel):
@@ -27,6 +51,11 @@ class UserChangePassword(BaseModel):
     old_password: str
     new_password: str
 
+    @field_validator("new_password")
+    @classmethod
+    def password_not_breached(cls, new_password):
+        return check_password_not_breached(new_password)
+
 
 class User(UserSignUp):
     register_date: date
@@ -39,8 +68,8 @@ class UserOut(BaseModel):
     email: EmailStr
     name: Optional[str]
     surname: Optional[str]
-    role: Role
-    register_date: date
+    role: str
+    register_date: datetime
 
     class Config:
         from_attributes = True
@@ -50,11 +79,44 @@ class UserMe(BaseModel):
     email: EmailStr
     name: Optional[str]
     surname: Optional[str]
-    register_date: date
-    role: Role
+    register_date: datetime
+    role: str
     permissions: List[str]
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class AuditEventOut(BaseModel):
+    user_email: str
+    event: str
+    detail: Optional[str]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class RoleIn(BaseModel):
+    permissions: List[str]
+    parents: List[str] = []
+
+
+class RoleOut(BaseModel):
+    name: str
+    permissions: List[str]
+    parents: List[str]
+    effective_permissions: List[str]
+
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(0.01, ge=0, le=1)
+    route_sample_rates: Dict[str, float] = {}
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+from jose import jwk
+from jose.backends.base import Key
+from etags import make_etag
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512")
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    algorithm: str
+    private_key: Optional[Key]
+    public_key: Key
+
+
+class Keyset(NamedTuple):
+    signing_key: SigningKey
+    keys: Dict[str, SigningKey]
+    accept_secret_key_tokens: bool
+    jwks_body: bytes
+    jwks_etag: str
+    jwks_max_age: int
+
+
+def _read_key(base_dir: str, path: str) -> str:
+    with open(os.path.join(base_dir, path)) as file:
+        return file.read()
+
+
+def load_keyset(path: str) -> Keyset:
+    """
+    Loads a keyset file such as:
+
+        {
+            "signing_kid": "2026-10",
+            "jwks_max_age": 300,
+            "accept_secret_key_tokens": false,
+            "keys": [
+                {"kid": "2026-10", "alg": "ES256", "private_key": "2026-10.pem"},
+                {"kid": "2026-07", "alg": "RS256", "public_key": "2026-07.pub.pem"}
+            ]
+        }
+
+    Every key is published in the JWKS and accepted when verifying, only
+    the `signing_kid` one signs new tokens. Key paths are relative to the
+    keyset file. All keys are parsed here, once.
+    """
+    with open(path) as file:
+        config = json.load(file)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    keys = {}
+    for key_config in config["keys"]:
+        kid, algorithm = key_config["kid"], key_config["alg"]
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ValueError(f"Key {kid} uses unsupported algorithm {algorithm}")
+        private_key = None
+        if "private_key" in key_config:
+            private_key = jwk.construct(_read_key(base_dir, key_config["private_key"]), algorithm)
+            public_key = private_key.public_key()
+        else:
+            public_key = jwk.construct(_read_key(base_dir, key_config["public_key"]), algorithm)
+        keys[kid] = SigningKey(kid, algorithm, private_key, public_key)
+
+    signing_key = keys.get(config["signing_kid"])
+    if signing_key is None or signing_key.private_key is None:
+        raise ValueError(f"Signing key {config['signing_kid']} needs a private key in the keyset")
+
+    jwks = {"keys": [
+        {**key.public_key.to_dict(), "kid": key.kid, "alg": key.algorithm, "use": "sig"}
+        for key in keys.values()
+    ]}
+    jwks_body = json.dumps(jwks).encode()
+    return Keyset(
+        signing_key=signing_key,
+        keys=keys,
+        accept_secret_key_tokens=config.get("accept_secret_key_tokens", False),
+        jwks_body=jwks_body,
+        jwks_etag=make_etag(jwks_body),
+        jwks_max_age=int(config.get("jwks_max_age", 300))
+    )
+
+
+@lru_cache
+def get_keyset() -> Optional[Keyset]:
+    from dotenv import load_dotenv
+    load_dotenv()
+    path = os.environ.get("JWT_KEYSET_FILE")
+    if not path:
+        return None
+    return load_keyset(path)
+
+
+def generate_private_key(algorithm: str) -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    if algorithm.startswith("RS"):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        curve = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}[algorithm]
+        private_key = ec.generate_private_key(curve())
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a private key for the JWT keyset.")
+    parser.add_argument("output", help="path of the PEM file to write")
+    parser.add_argument("--alg", choices=ASYMMETRIC_ALGORITHMS, default="ES256")
+    args = parser.parse_args()
+    with open(args.output, "wb") as file:
+        file.write(generate_private_key(args.alg))
+    os.chmod(args.output, 0o600)